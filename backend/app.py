@@ -1,22 +1,95 @@
 import os
 import json
 import tempfile
-import zipfile
-from flask import Flask, request, jsonify, send_file
+import queue
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
-from worldbank_downloader import WorldBankDocDownloader
-import requests
-from document_renamer import rename_document_with_project_id
+from worldbank_downloader import (
+    WorldBankDocDownloader, manifest_entries, manifest_json, manifest_csv, MANIFEST_JSON, MANIFEST_CSV
+)
+from download_scheduler import get_scheduler
+from progress_events import progress_bus, format_sse, RENAMED, ZIP_MEMBER_WRITTEN, JOB_FINISHED
+# zipfile, requests and document_renamer (PyPDF2) are imported inside the routes
+# that need them to keep worker startup fast
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Create a temporary directory for downloads
 TEMP_DIR = tempfile.mkdtemp()
 
+# One scheduler caps concurrent downloads across all requests in this process
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get('MAX_CONCURRENT_DOWNLOADS', 10))
+scheduler = get_scheduler(max_workers=MAX_CONCURRENT_DOWNLOADS)
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_KEEPALIVE_INTERVAL = 15
+
+def make_downloader(output_dir, data, **kwargs):
+    """Create a server-mode downloader that reports progress to the request's job."""
+    job_id = data.get('jobId')
+    progress = progress_bus.channel(job_id) if job_id else None
+    return WorldBankDocDownloader(
+        output_dir=output_dir,
+        progress=progress,
+        show_progress=False,
+        **kwargs
+    )
+
+def write_zip_manifest(zipf, results):
+    """Add checksum manifests for the archived documents to a zip file."""
+    entries = manifest_entries(results)
+    zipf.writestr(MANIFEST_JSON, manifest_json(entries))
+    zipf.writestr(MANIFEST_CSV, manifest_csv(entries))
+
+def finish_job(data, **info):
+    """Tell event stream subscribers that the request's job is done."""
+    job_id = data.get('jobId')
+    if job_id:
+        progress_bus.publish(job_id, JOB_FINISHED, **info)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'ok'})
 
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Stream progress events for a job as Server-Sent Events.
+    
+    Clients pick a job ID, open this stream, then pass the same ID as "jobId"
+    in the body of a search or download request. The stream ends when the job
+    finishes.
+    
+    Events are delivered in-process only, and the stream holds its worker for
+    as long as it is open. Run the app as a single process that serves
+    requests concurrently, e.g. `gunicorn --workers 1 --threads 16 app:app`
+    (or the gevent worker class). With several worker processes, the stream and
+    the download can land in different processes and no events arrive. With a
+    single sync worker, the download request waits behind the open stream.
+    """
+    listener = progress_bus.subscribe(job_id)
+    
+    def generate():
+        try:
+            # Flush headers right away so the client knows it is subscribed
+            yield ": subscribed\n\n"
+            while True:
+                try:
+                    event = listener.get(timeout=EVENT_KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+                if event['type'] == JOB_FINISHED:
+                    break
+        finally:
+            progress_bus.unsubscribe(job_id, listener)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/search', methods=['POST'])
 def search_documents():
     data = request.json
@@ -32,7 +105,7 @@ def search_documents():
     max_results = int(data.get('maxResults', 100))
     
     # Initialize downloader
-    downloader = WorldBankDocDownloader(output_dir=TEMP_DIR)
+    downloader = make_downloader(TEMP_DIR, data)
     
     # Search for documents
     documents = downloader.search_documents(
@@ -45,6 +118,7 @@ def search_documents():
         language=language,
         max_results=max_results
     )
+    finish_job(data, count=len(documents))
     
     # Return document metadata
     return jsonify({
@@ -65,7 +139,7 @@ def search_by_project():
         return jsonify({'error': 'No project IDs provided'}), 400
     
     # Initialize downloader
-    downloader = WorldBankDocDownloader(output_dir=TEMP_DIR)
+    downloader = make_downloader(TEMP_DIR, data)
     
     # Search for documents by project IDs
     project_documents = downloader.search_by_project_ids(
@@ -80,6 +154,7 @@ def search_by_project():
         for doc in docs:
             doc['project_id'] = project_id
             all_docs.append(doc)
+    finish_job(data, count=len(all_docs))
     
     return jsonify({
         'count': len(all_docs),
@@ -88,6 +163,8 @@ def search_by_project():
 
 @app.route('/api/download', methods=['POST'])
 def download_documents():
+    import zipfile
+    
     data = request.json
     documents = data.get('documents', [])
     
@@ -98,10 +175,11 @@ def download_documents():
     download_dir = os.path.join(TEMP_DIR, f"download_{os.urandom(4).hex()}")
     os.makedirs(download_dir, exist_ok=True)
     
-    # Initialize downloader
-    downloader = WorldBankDocDownloader(output_dir=download_dir)
+    # Initialize downloader on the shared scheduler
+    downloader = make_downloader(download_dir, data, rate_limit=0, scheduler=scheduler)
     
-    # Download documents
+    # Download documents; each request is its own fair-share job, since the
+    # client address is the same for everyone behind a reverse proxy
     results = downloader.bulk_download(documents)
     
     # Create a zip file of all downloaded documents
@@ -113,6 +191,9 @@ def download_documents():
             format_info = result.get('format', 'pdf')  # Default to pdf if not specified
             archive_name = os.path.basename(file_path)
             zipf.write(file_path, archive_name)
+            downloader.emit_event(ZIP_MEMBER_WRITTEN, doc_id=result['doc_id'], name=archive_name)
+        write_zip_manifest(zipf, results['success'])
+    finish_job(data, succeeded=len(results['success']), failed=len(results['failed']))
     
     # Return the zip file
     return send_file(
@@ -124,6 +205,9 @@ def download_documents():
 
 @app.route('/api/download-and-rename', methods=['POST'])
 def download_and_rename_documents():
+    import zipfile
+    from document_renamer import rename_document_with_project_id
+    
     data = request.json
     documents = data.get('documents', [])
     
@@ -134,10 +218,11 @@ def download_and_rename_documents():
     download_dir = os.path.join(TEMP_DIR, f"download_{os.urandom(4).hex()}")
     os.makedirs(download_dir, exist_ok=True)
     
-    # Initialize downloader
-    downloader = WorldBankDocDownloader(output_dir=download_dir)
+    # Initialize downloader on the shared scheduler
+    downloader = make_downloader(download_dir, data, rate_limit=0, scheduler=scheduler)
     
-    # Download documents
+    # Download documents; each request is its own fair-share job, since the
+    # client address is the same for everyone behind a reverse proxy
     results = downloader.bulk_download(documents)
     
     # Apply renaming logic to the downloaded documents
@@ -145,8 +230,9 @@ def download_and_rename_documents():
     for result in results['success']:
         file_path = result['path']
         renamed_path = rename_document_with_project_id(file_path, download_dir)
+        downloader.emit_event(RENAMED, doc_id=result['doc_id'], file=os.path.basename(renamed_path or file_path))
         renamed_results.append({
-            'doc_id': result['doc_id'],
+            **result,
             'path': renamed_path or file_path  # Use original path if renaming failed
         })
     
@@ -156,6 +242,9 @@ def download_and_rename_documents():
         for result in renamed_results:
             file_path = result['path']
             zipf.write(file_path, os.path.basename(file_path))
+            downloader.emit_event(ZIP_MEMBER_WRITTEN, doc_id=result['doc_id'], name=os.path.basename(file_path))
+        write_zip_manifest(zipf, renamed_results)
+    finish_job(data, succeeded=len(results['success']), failed=len(results['failed']))
     
     # Return the zip file
     return send_file(
@@ -168,6 +257,8 @@ def download_and_rename_documents():
 @app.route('/api/document-types', methods=['GET'])
 def get_document_types():
     """Get available document types from the World Bank API"""
+    import requests
+    
     try:
         # Make request to the World Bank API for document type facets
         response = requests.get(
@@ -0,0 +1,89 @@
+"""Startup-time benchmark for the CLI and the Flask app.
+
+Each check runs in fresh interpreters. The cost of starting a bare interpreter
+is subtracted, so budgets measure only our own import work. The script exits
+with status 1 if a median goes over its budget or if a heavy dependency is
+imported eagerly again.
+
+Usage:
+    python benchmark_startup.py [--runs N] [--budget-scale X]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (name, Python code to run, budget in milliseconds above bare interpreter startup)
+CHECKS = [
+    ("import worldbank_downloader", "import worldbank_downloader", 60),
+    ("worldbank_downloader.py --help",
+     "import sys; sys.argv = ['worldbank_downloader.py', '--help']\n"
+     "import worldbank_downloader\n"
+     "try:\n    worldbank_downloader.main()\nexcept SystemExit:\n    pass", 80),
+    ("import app", "import app", 300),
+]
+
+# Modules that must not be loaded just by importing each entry point
+LAZY_MODULES = {
+    "worldbank_downloader": ["requests", "tqdm", "argparse", "sqlite3", "zipfile"],
+    "app": ["requests", "tqdm", "sqlite3", "PyPDF2", "document_renamer"],
+}
+
+
+def time_run(code, runs):
+    """Return the median wall time in milliseconds of running code in a fresh interpreter."""
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def loaded_modules(module, names):
+    """Return the names from the list that are loaded after importing module."""
+    code = (
+        f"import sys{', ' + module if module else ''}\n"
+        f"print(' '.join(name for name in {names!r} if name in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True,
+                            capture_output=True, text=True).stdout
+    return output.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check startup time against budgets")
+    parser.add_argument("--runs", type=int, default=7, help="Runs per check (the median is used)")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="Multiply every budget, e.g. for slow CI machines")
+    args = parser.parse_args()
+
+    failed = False
+    baseline = time_run("pass", args.runs)
+    print(f"Bare interpreter startup: {baseline:.1f} ms")
+
+    for name, code, budget in CHECKS:
+        budget *= args.budget_scale
+        elapsed = time_run(code, args.runs) - baseline
+        status = "ok" if elapsed <= budget else "OVER BUDGET"
+        print(f"{name}: {elapsed:.1f} ms (budget {budget:.0f} ms) {status}")
+        failed |= elapsed > budget
+
+    for module, names in LAZY_MODULES.items():
+        # Ignore modules the interpreter itself loads at startup (e.g. via site)
+        preloaded = set(loaded_modules(None, names))
+        loaded = [name for name in loaded_modules(module, names) if name not in preloaded]
+        if loaded:
+            print(f"import {module} eagerly loads: {', '.join(loaded)}")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
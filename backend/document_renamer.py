@@ -1,5 +1,4 @@
 import re
-import PyPDF2
 from pathlib import Path
 from typing import Optional, Tuple
 
@@ -16,6 +15,9 @@ def extract_project_id(pdf_path: str, max_pages: int = 10) -> Optional[str]:
         The project ID if found, None otherwise
     """
     try:
+        # Imported here so that importing this module doesn't load PyPDF2
+        import PyPDF2
+        
         with open(pdf_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
             # Limit the number of pages to search
@@ -0,0 +1,138 @@
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+# Priority classes, lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Jobs with at most this many documents are treated as interactive
+INTERACTIVE_JOB_SIZE = 20
+
+# Worker slots that no single priority class may take, so the other class
+# always has a worker free for it
+RESERVED_WORKERS = 1
+
+
+class DownloadScheduler:
+    """Process-wide task scheduler shared by every download job.
+
+    A fixed set of worker threads caps the total number of concurrent downloads
+    for the whole process. Each submitted job is classed as interactive or bulk
+    by its size. Workers serve the most urgent class that has pending work, and
+    within a class they take one task from each job in turn, so a large job
+    cannot starve a small one that arrives after it.
+
+    Running tasks are never preempted. Instead, neither class may occupy more
+    than max_workers - RESERVED_WORKERS workers. A small job therefore finds a
+    free worker even while bulk work saturates the rest, and a steady stream
+    of interactive jobs cannot starve bulk jobs completely. The trade-off is
+    that a lone bulk job uses one worker fewer than it could.
+    """
+
+    def __init__(self, max_workers=10):
+        """Initialize the scheduler. Worker threads are started on first use."""
+        self.max_workers = max_workers
+        self._class_limit = max(1, max_workers - RESERVED_WORKERS)
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        # priority -> OrderedDict(job_key -> deque of (future, fn, args))
+        self._queues = {}
+        self._running = {}  # priority -> number of tasks running
+        self._workers = []
+        self._job_ids = itertools.count(1)
+
+    def submit_job(self, fn, args_list):
+        """Queue one call of fn per entry in args_list as a single job.
+
+        Args:
+            fn: Callable to run on the worker threads
+            args_list: Sequence of argument tuples, one per task
+
+        Returns:
+            List of Futures in the same order as args_list
+        """
+        job_key = next(self._job_ids)
+        if len(args_list) <= INTERACTIVE_JOB_SIZE:
+            priority = PRIORITY_INTERACTIVE
+        else:
+            priority = PRIORITY_BULK
+
+        futures = []
+        with self._lock:
+            jobs = self._queues.setdefault(priority, OrderedDict())
+            tasks = jobs.setdefault(job_key, deque())
+            for args in args_list:
+                future = Future()
+                tasks.append((future, fn, args))
+                futures.append(future)
+            self._ensure_workers()
+            self._work_available.notify(len(futures))
+        return futures
+
+    def _ensure_workers(self):
+        """Start worker threads up to max_workers. Caller must hold the lock."""
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"download-worker-{len(self._workers) + 1}",
+                daemon=True
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_task(self):
+        """Pop the next task to run and its priority. Caller must hold the lock."""
+        for priority in sorted(self._queues):
+            if self._running.get(priority, 0) >= self._class_limit:
+                continue
+            jobs = self._queues[priority]
+            while jobs:
+                # Take the job at the front and move it to the back (round robin)
+                job_key, tasks = jobs.popitem(last=False)
+                if not tasks:
+                    continue
+                task = tasks.popleft()
+                if tasks:
+                    jobs[job_key] = tasks
+                self._running[priority] = self._running.get(priority, 0) + 1
+                return priority, task
+        return None
+
+    def _worker_loop(self):
+        """Run queued tasks forever."""
+        while True:
+            with self._lock:
+                next_task = self._next_task()
+                while next_task is None:
+                    self._work_available.wait()
+                    next_task = self._next_task()
+
+            priority, (future, fn, args) = next_task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._lock:
+                    self._running[priority] -= 1
+                    # A class that was at its limit may now run another task
+                    self._work_available.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(max_workers=10):
+    """Return the process-wide scheduler, creating it on first call."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DownloadScheduler(max_workers=max_workers)
+        return _scheduler
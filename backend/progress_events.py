@@ -0,0 +1,87 @@
+import json
+import queue
+import threading
+import time
+
+# Event types emitted by the downloader and the Flask routes
+PAGE_FETCHED = "page-fetched"
+DOCUMENT_STARTED = "document-started"
+BYTES_TRANSFERRED = "bytes-transferred"
+FORMAT_FALLBACK = "format-fallback"
+DOCUMENT_FINISHED = "document-finished"
+RENAMED = "renamed"
+ZIP_MEMBER_WRITTEN = "zip-member-written"
+JOB_FINISHED = "job-finished"
+
+
+class ProgressBus:
+    """In-process publish/subscribe hub for progress events.
+
+    Events are only built and queued for channels that have at least one
+    subscriber, so publishers can check `active` and skip all work otherwise.
+    Subscribers only see events published in the same process (see the
+    /api/jobs/<job_id>/events route for the deployment this requires).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> list of queue.Queue
+
+    def subscribe(self, channel):
+        """Register a new listener on a channel and return its event queue."""
+        listener = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(listener)
+        return listener
+
+    def unsubscribe(self, channel, listener):
+        """Remove a listener returned by subscribe."""
+        with self._lock:
+            listeners = self._subscribers.get(channel, [])
+            if listener in listeners:
+                listeners.remove(listener)
+            if not listeners:
+                self._subscribers.pop(channel, None)
+
+    def has_subscribers(self, channel):
+        """Return True if anyone is listening on the channel."""
+        return channel in self._subscribers
+
+    def publish(self, channel, event_type, **data):
+        """Send an event with a timestamp to every listener on the channel."""
+        listeners = self._subscribers.get(channel)
+        if not listeners:
+            return
+        event = {"type": event_type, "timestamp": time.time(), **data}
+        for listener in list(listeners):
+            listener.put(event)
+
+    def channel(self, channel):
+        """Return a ProgressChannel bound to this bus."""
+        return ProgressChannel(self, channel)
+
+
+class ProgressChannel:
+    """A single job's view of the progress bus."""
+
+    def __init__(self, bus, name):
+        self.bus = bus
+        self.name = name
+
+    @property
+    def active(self):
+        """True if anyone is listening to this job's events."""
+        return self.bus.has_subscribers(self.name)
+
+    def emit(self, event_type, **data):
+        """Publish an event on this job's channel."""
+        self.bus.publish(self.name, event_type, **data)
+
+
+def format_sse(event):
+    """Serialize an event dictionary as a Server-Sent Events message."""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+# Shared bus for the whole process
+progress_bus = ProgressBus()
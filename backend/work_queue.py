@@ -0,0 +1,379 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+
+class SQLiteTaskQueue:
+    """Document download queue stored in a SQLite file.
+
+    A coordinator puts documents on the queue and any number of workers lease
+    them one at a time. Concurrency control relies on SQLite file locking, so
+    the file must be on a local disk and only opened by processes on that
+    machine: locking is unreliable on network filesystems such as NFS or SMB,
+    where leases could be handed out twice or the database corrupted. Workers
+    on other machines reach the queue through serve_queue and HTTPTaskQueue
+    instead. Workers
+    renew their leases while they work. A lease that is not renewed or completed
+    within lease_seconds (for example because the worker died) expires and the
+    task goes back to other workers, up to max_attempts. A failed task waits
+    retry_backoff seconds, doubling with each attempt, before it is retried.
+    """
+
+    def __init__(self, path, lease_seconds=600, max_attempts=3, retry_backoff=30):
+        """Open the queue at path, creating the database if needed."""
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id TEXT NOT NULL,
+                    project_id TEXT NOT NULL DEFAULT '',
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    lease_expires REAL,
+                    available_at REAL NOT NULL DEFAULT 0,
+                    result TEXT,
+                    UNIQUE (doc_id, project_id)
+                )
+            """)
+            # Queues created before retry backoff existed lack available_at
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+            if "available_at" not in columns:
+                conn.execute("ALTER TABLE tasks ADD COLUMN available_at REAL NOT NULL DEFAULT 0")
+            # Leasing walks these in order instead of sorting the whole queue
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status_id ON tasks (status, id)")
+
+    def _connect(self):
+        """Open a connection in autocommit mode. Connections are not shared across threads."""
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def put_many(self, documents, project_id=None):
+        """Add documents to the queue, skipping ones already queued.
+
+        Returns:
+            Number of new tasks added
+        """
+        rows = [
+            (str(doc.get("id", "")), project_id or "", json.dumps(doc))
+            for doc in documents
+        ]
+        with closing(self._connect()) as conn:
+            before = conn.total_changes
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (doc_id, project_id, payload) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+
+    def lease(self, worker_id):
+        """Claim the next available task for a worker.
+
+        Returns:
+            Tuple of (task_id, document, project_id), or None if nothing is available
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Give up on tasks whose last allowed lease has expired
+                conn.execute(
+                    "UPDATE tasks SET status = 'failed', result = ? "
+                    "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                    (json.dumps({"error": "Lease expired"}), now, self.max_attempts)
+                )
+                row = conn.execute(
+                    "SELECT id, payload, project_id FROM tasks "
+                    "WHERE status = 'pending' AND available_at <= ? ORDER BY id LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    # Only look for abandoned leases once nothing is pending
+                    row = conn.execute(
+                        "SELECT id, payload, project_id FROM tasks "
+                        "WHERE status = 'leased' AND lease_expires < ? ORDER BY lease_expires LIMIT 1",
+                        (now,)
+                    ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE tasks SET status = 'leased', worker = ?, lease_expires = ?, "
+                        "attempts = attempts + 1 WHERE id = ?",
+                        (worker_id, now + self.lease_seconds, row[0])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        task_id, payload, project_id = row
+        return task_id, json.loads(payload), project_id or None
+
+    def renew(self, task_id, worker_id):
+        """Extend a worker's lease on a task.
+
+        Returns:
+            False if the lease was lost to another worker or the task is finished
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + self.lease_seconds, task_id, worker_id)
+            )
+            return cursor.rowcount > 0
+
+    def complete(self, task_id, worker_id, result):
+        """Record a successful download. Ignored if the lease was lost."""
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, lease_expires = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(result), task_id, worker_id)
+            )
+
+    def fail(self, task_id, worker_id, result):
+        """Record a failed attempt, putting the task back unless it is out of attempts.
+
+        The task becomes available again after an exponential backoff, so a host
+        that is briefly down doesn't use up every attempt at once.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE tasks SET result = ?, lease_expires = NULL, "
+                "available_at = ? + ? * (1 << (attempts - 1)), "
+                "status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                (json.dumps(result), time.time(), self.retry_backoff, self.max_attempts,
+                 task_id, worker_id)
+            )
+
+    def counts(self):
+        """Return the number of tasks in each status."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self, status):
+        """Return the recorded results of tasks with the given status."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT result FROM tasks WHERE status = ? AND result IS NOT NULL ORDER BY id",
+                (status,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+# Queue methods that HTTPTaskQueue clients may call on serve_queue
+QUEUE_METHODS = ("put_many", "lease", "renew", "complete", "fail", "counts", "results")
+
+
+def serve_queue(task_queue, host="127.0.0.1", port=8750):
+    """Serve a SQLiteTaskQueue over HTTP so workers on other machines can use it.
+
+    Each request is a POST to /<method> with the method's keyword arguments as
+    a JSON object, answered with the JSON-encoded return value. GET /settings
+    returns the lease settings workers need. The server has no authentication,
+    so only expose it on a trusted network.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class QueueRequestHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != "/settings":
+                return self._reply(404, {"error": "Not found"})
+            self._reply(200, {"lease_seconds": task_queue.lease_seconds})
+
+        def do_POST(self):
+            method = self.path.strip("/")
+            if method not in QUEUE_METHODS:
+                return self._reply(404, {"error": f"Unknown queue method: {method}"})
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                kwargs = json.loads(self.rfile.read(length) or b"{}")
+                self._reply(200, getattr(task_queue, method)(**kwargs))
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), QueueRequestHandler)
+    print(f"Serving queue {task_queue.path} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class HTTPTaskQueue:
+    """Client for a queue served by serve_queue, with the SQLiteTaskQueue interface."""
+
+    def __init__(self, url, timeout=60):
+        """Connect to the queue server at url and fetch its lease settings."""
+        import requests
+
+        self.url = url.rstrip("/")
+        self.path = self.url
+        self.timeout = timeout
+        self._session = requests.Session()
+        response = self._session.get(f"{self.url}/settings", timeout=timeout)
+        response.raise_for_status()
+        self.lease_seconds = response.json()["lease_seconds"]
+
+    def _call(self, method, **kwargs):
+        response = self._session.post(f"{self.url}/{method}", json=kwargs, timeout=self.timeout)
+        if response.status_code != 200:
+            raise IOError(f"Queue server error in {method}: {response.json().get('error')}")
+        return response.json()
+
+    def put_many(self, documents, project_id=None):
+        return self._call("put_many", documents=documents, project_id=project_id)
+
+    def lease(self, worker_id):
+        task = self._call("lease", worker_id=worker_id)
+        return tuple(task) if task is not None else None
+
+    def renew(self, task_id, worker_id):
+        return self._call("renew", task_id=task_id, worker_id=worker_id)
+
+    def complete(self, task_id, worker_id, result):
+        self._call("complete", task_id=task_id, worker_id=worker_id, result=result)
+
+    def fail(self, task_id, worker_id, result):
+        self._call("fail", task_id=task_id, worker_id=worker_id, result=result)
+
+    def counts(self):
+        return self._call("counts")
+
+    def results(self, status):
+        return self._call("results", status=status)
+
+
+def open_queue(location, **kwargs):
+    """Open a queue by URL (a serve_queue server) or by local SQLite file path.
+
+    Keyword arguments are SQLiteTaskQueue settings and only apply to files.
+    """
+    if location.startswith(("http://", "https://")):
+        return HTTPTaskQueue(location)
+    return SQLiteTaskQueue(location, **kwargs)
+
+
+def default_worker_id():
+    """Return a worker ID that is unique across machines and processes."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(task_queue, downloader, worker_id=None, threads=5, poll_interval=5, wait=False):
+    """Lease and download tasks until the queue is drained.
+
+    Args:
+        task_queue: SQLiteTaskQueue or HTTPTaskQueue to take tasks from
+        downloader: WorldBankDocDownloader used for each task
+        worker_id: ID recorded on leases (defaults to host name and PID)
+        threads: Number of tasks to download at once
+        poll_interval: Seconds to wait when no task is available
+        wait: Keep polling for new tasks instead of exiting once the queue is empty
+
+    Returns:
+        Dictionary with the number of tasks this worker completed and failed
+    """
+    worker_id = worker_id or default_worker_id()
+    stats = {"completed": 0, "failed": 0}
+    stats_lock = threading.Lock()
+    active_tasks = set()
+    stopped = threading.Event()
+
+    def heartbeat():
+        # Renew leases well before they expire so long downloads keep their task
+        while not stopped.wait(task_queue.lease_seconds / 3):
+            with stats_lock:
+                task_ids = list(active_tasks)
+            for task_id in task_ids:
+                try:
+                    task_queue.renew(task_id, worker_id)
+                except Exception as e:
+                    print(f"Error renewing lease on task {task_id}: {str(e)}")
+
+    def work():
+        while True:
+            try:
+                if not process_next():
+                    return
+            except Exception as e:
+                # A locked database or unreachable queue server shouldn't kill
+                # the thread. An unfinished lease just expires and is retried.
+                print(f"Queue error in worker {worker_id}: {str(e)}")
+                time.sleep(poll_interval)
+
+    def process_next():
+        """Lease and download one task. Returns False once the queue is drained."""
+        task = task_queue.lease(worker_id)
+        if task is None:
+            counts = task_queue.counts()
+            if not wait and counts["pending"] == 0 and counts["leased"] == 0:
+                return False
+            # Other workers still hold leases that may expire and come back
+            time.sleep(poll_interval)
+            return True
+
+        task_id, doc, project_id = task
+        with stats_lock:
+            active_tasks.add(task_id)
+        try:
+            result = downloader.download_document(doc)
+        finally:
+            with stats_lock:
+                active_tasks.discard(task_id)
+        if project_id:
+            result["project_id"] = project_id
+
+        if result["success"]:
+            task_queue.complete(task_id, worker_id, result)
+            key = "completed"
+        else:
+            task_queue.fail(task_id, worker_id, result)
+            key = "failed"
+        with stats_lock:
+            stats[key] += 1
+
+        # Honor rate limits between downloads
+        time.sleep(downloader.rate_limit)
+        return True
+
+    renewer = threading.Thread(target=heartbeat, name="queue-heartbeat", daemon=True)
+    renewer.start()
+
+    workers = [threading.Thread(target=work, name=f"queue-worker-{i + 1}") for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    stopped.set()
+
+    return stats
@@ -1,30 +1,194 @@
+# Heavy dependencies (requests, tqdm, argparse, the work queue) are imported
+# where they are used so that importing this module and running --help stay fast
 import os
-import requests
+import hashlib
 import json
-from tqdm import tqdm
-import argparse
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time
 from datetime import datetime
+from progress_events import (
+    PAGE_FETCHED, DOCUMENT_STARTED, BYTES_TRANSFERRED, FORMAT_FALLBACK, DOCUMENT_FINISHED
+)
+
+# Magic bytes that a downloaded file must start with, by format
+FILE_SIGNATURES = {
+    "pdf": (b'%PDF',),
+    "docx": (b'PK\x03\x04',),  # ZIP archive
+    "doc": (b'\xD0\xCF',),      # OLE compound document
+    "tiff": (b'II*\x00', b'MM\x00*'),
+}
+SIGNATURE_LENGTH = max(len(sig) for sigs in FILE_SIGNATURES.values() for sig in sigs)
+
+def has_valid_signature(file_format, header):
+    """Check whether the first bytes of a file match the expected format."""
+    return any(header.startswith(sig) for sig in FILE_SIGNATURES.get(file_format, ()))
+
+# Shared pool for hedged download requests, created on first use
+_hedge_pool = None
+_hedge_pool_size = 0
+_hedge_pool_lock = threading.Lock()
+
+def _get_hedge_pool(size):
+    """Return the thread pool used to race candidate URLs, with at least size threads."""
+    global _hedge_pool, _hedge_pool_size
+    with _hedge_pool_lock:
+        if _hedge_pool is None or _hedge_pool_size < size:
+            old_pool = _hedge_pool
+            _hedge_pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix="hedge")
+            _hedge_pool_size = size
+            if old_pool is not None:
+                # Requests already submitted to the old pool still run to completion
+                old_pool.shutdown(wait=False)
+        return _hedge_pool
+
+def _close_response(future):
+    """Close the response of a hedged request nobody is waiting for."""
+    response = future.result()
+    if response is not None:
+        response.close()
+
+_read_timeout_warned = False
+
+def _set_read_timeout(response, timeout):
+    """Switch a streaming response's socket to a new read timeout.
+    
+    requests applies one read timeout to the whole exchange; this swaps the
+    first-byte timeout for the stall timeout once the headers have arrived.
+    It reaches the socket through private attributes of urllib3's response
+    (tested with urllib3 2.x, see requirements.txt). If they aren't there, it
+    warns once and the stall limit stays at the first-byte timeout.
+    """
+    global _read_timeout_warned
+    sock = getattr(getattr(getattr(getattr(response.raw, '_fp', None), 'fp', None), 'raw', None), '_sock', None)
+    if sock is None or not hasattr(sock, 'settimeout'):
+        if not _read_timeout_warned:
+            _read_timeout_warned = True
+            print("Warning: can't reach the download socket to set the stall timeout; "
+                  "using the first-byte timeout for stalls instead")
+        return
+    sock.settimeout(timeout)
+
+# Checksum manifest written alongside downloads
+MANIFEST_FIELDS = ["doc_id", "project_id", "file", "format", "size", "sha256"]
+MANIFEST_JSON = "manifest.json"
+MANIFEST_CSV = "manifest.csv"
+
+def manifest_entries(results):
+    """Build manifest rows from successful download results."""
+    return [
+        {
+            "doc_id": result.get("doc_id"),
+            "project_id": result.get("project_id", ""),
+            "file": os.path.basename(result["path"]),
+            "format": result.get("format"),
+            "size": result.get("size"),
+            "sha256": result.get("sha256"),
+        }
+        for result in results
+    ]
+
+def manifest_json(entries):
+    """Serialize manifest rows as JSON."""
+    return json.dumps(entries, indent=2)
+
+def manifest_csv(entries):
+    """Serialize manifest rows as CSV."""
+    import csv
+    import io
+    
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=MANIFEST_FIELDS)
+    writer.writeheader()
+    writer.writerows(entries)
+    return output.getvalue()
+
+def write_manifest(entries, directory):
+    """Write the JSON and CSV manifests into a directory."""
+    with open(os.path.join(directory, MANIFEST_JSON), 'w') as f:
+        f.write(manifest_json(entries))
+    with open(os.path.join(directory, MANIFEST_CSV), 'w', newline='') as f:
+        f.write(manifest_csv(entries))
+
+class _NullProgressBar:
+    """Stand-in for tqdm when progress bars are turned off."""
+    
+    def __init__(self, iterable=None, **kwargs):
+        self.iterable = iterable
+    
+    def __iter__(self):
+        return iter(self.iterable)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def update(self, n=1):
+        pass
 
 class WorldBankDocDownloader:
     """Tool to bulk download documents from the World Bank API."""
     
     BASE_URL = "https://search.worldbank.org/api/v3/wds"
     DOWNLOAD_BASE_URL = "https://documents.worldbank.org"
+    FORMAT_PREFERENCES = ["pdf", "docx", "doc", "tiff"]
+    BYTES_EVENT_INTERVAL = 0.25  # Minimum seconds between bytes-transferred events
     
-    def __init__(self, output_dir="downloads", max_workers=5, rate_limit=1):
-        """Initialize the downloader with configuration options."""
+    # Body transfer tuning: chunk size adapts between these bounds so that each
+    # read takes roughly TARGET_READ_SECONDS
+    MIN_CHUNK_SIZE = 64 * 1024
+    MAX_CHUNK_SIZE = 1024 * 1024
+    TARGET_READ_SECONDS = 0.1
+    
+    def __init__(self, output_dir="downloads", max_workers=5, rate_limit=1, scheduler=None,
+                 progress=None, show_progress=True, connect_timeout=10, first_byte_timeout=30,
+                 stall_timeout=60, hedge_delay=None, integrity_retries=2):
+        """Initialize the downloader with configuration options.
+        
+        If a scheduler is given, bulk downloads are queued on it instead of on a
+        private thread pool, and max_workers is ignored. If a progress channel is
+        given, progress events are published to it while anyone is subscribed.
+        Set show_progress to False to turn off the tqdm bars (server mode).
+        
+        Timeouts are in seconds: connect_timeout for opening a connection,
+        first_byte_timeout for the response headers, and stall_timeout for any
+        gap while reading a body. If hedge_delay is set, download_document starts
+        the next candidate URL when one hasn't answered within that many seconds.
+        Truncated downloads are retried up to integrity_retries times.
+        """
         self.output_dir = output_dir
         self.max_workers = max_workers
         self.rate_limit = rate_limit
+        self.scheduler = scheduler
+        self.progress = progress
+        self.show_progress = show_progress
+        self.connect_timeout = connect_timeout
+        self.first_byte_timeout = first_byte_timeout
+        self.stall_timeout = stall_timeout
+        self.hedge_delay = hedge_delay
+        self.integrity_retries = integrity_retries
         
         # Create output directory if it doesn't exist
         os.makedirs(output_dir, exist_ok=True)
     
+    def _progress_bar(self, iterable=None, **kwargs):
+        """Return a tqdm bar, or a no-op bar when progress bars are off."""
+        if not self.show_progress:
+            return _NullProgressBar(iterable, **kwargs)
+        from tqdm import tqdm
+        return tqdm(iterable, **kwargs)
+    
+    def emit_event(self, event_type, **data):
+        """Publish a progress event if anyone is listening."""
+        if self.progress is not None and self.progress.active:
+            self.progress.emit(event_type, **data)
+    
     def search_documents(self, query="", doc_type=None, country=None, topic=None, 
                         from_date=None, to_date=None, language=None, max_results=100):
         """Search for documents using World Bank API"""
+        import requests
         documents = []
         page = 1
         rows_per_page = min(max_results, 100)  # API limit is 100 per page
@@ -63,7 +227,7 @@ class WorldBankDocDownloader:
             filters['todt'] = date_range[1]
             
         print(f"Fetching document metadata:", end=' ')
-        with tqdm(total=None, unit='page') as pbar:
+        with self._progress_bar(total=None, unit='page') as pbar:
             while len(documents) < max_results:
                 try:
                     # Build the API request parameters
@@ -78,7 +242,8 @@ class WorldBankDocDownloader:
                     params.update(filters)
                     
                     # Make the API request
-                    response = requests.get(self.BASE_URL, params=params)
+                    response = requests.get(self.BASE_URL, params=params,
+                                            timeout=(self.connect_timeout, self.first_byte_timeout))
                     response.raise_for_status()
                     data = response.json()
                     
@@ -88,6 +253,7 @@ class WorldBankDocDownloader:
                         break
                         
                     documents.extend(results)
+                    self.emit_event(PAGE_FETCHED, page=page, count=len(results))
                     page += 1
                     pbar.update(1)
                     
@@ -105,176 +271,438 @@ class WorldBankDocDownloader:
         return documents
     
     def download_document(self, doc):
-        """Download a single document with format fallback (PDF → DOCX → DOC → TIFF)."""
+        """Download a single document with format fallback (PDF → DOCX → DOC → TIFF).
+        
+        Candidate URLs are tried in preference order. If hedge_delay is set, a
+        candidate that hasn't returned headers within that many seconds gets the
+        next one started alongside it, and the first valid response wins.
+        """
         try:
             # Extract document information
             doc_id = doc.get("id")
             title = doc.get("display_title", doc.get("title", "Unknown"))
+            self.emit_event(DOCUMENT_STARTED, doc_id=doc_id, title=title)
+            safe_title = "".join(c if c.isalnum() else "_" for c in title)
             
-            # Define format preference order
-            format_preferences = ["pdf", "docx", "doc", "tiff"]
-            
-            for file_format in format_preferences:
-                try:
-                    # Construct URL for this format
-                    file_url = None
-                    
-                    # First try from document metadata
-                    if "pdfurl" in doc and file_format == "pdf":
-                        file_url = doc["pdfurl"]
-                    elif "guid" in doc and doc["guid"]:
-                        # Construct URL based on format
-                        guid = doc["guid"]
-                        file_url = f"http://documents.worldbank.org/curated/en/{guid}/{file_format}/document.{file_format}"
-                    
-                    # If no direct URL, try to extract from the document page (for PDF only currently)
-                    if not file_url and file_format == "pdf" and "url" in doc:
-                        doc_page_url = doc["url"]
-                        print(f"No direct URL found. Trying to extract from document page: {doc_page_url}")
+            candidates = self._candidate_urls(doc)
+            responses = self._open_candidates(candidates, doc_id)
+            try:
+                for file_format, file_url, response in responses:
+                    try:
+                        # Create filename with appropriate extension
+                        filename = f"{doc_id}_{safe_title[:50]}.{file_format}"
+                        file_path = os.path.join(self.output_dir, filename)
                         
-                        try:
-                            # Download the document page
-                            response = requests.get(doc_page_url)
-                            response.raise_for_status()
-                            html_content = response.text
-                            
-                            # Extract the document ID/GUID from the canonical URL
-                            import re
-                            canonical_match = re.search(r'<link rel="canonical" href="[^"]+/en/(\d+)"', html_content)
-                            if canonical_match:
-                                guid = canonical_match.group(1)
-                                file_url = f"http://documents.worldbank.org/curated/en/{guid}/{file_format}/document.{file_format}"
-                            else:
-                                # Try to find URL directly in the HTML
-                                format_match = re.search(rf'href="([^"]+\.{file_format})"', html_content)
-                                if format_match:
-                                    file_url = format_match.group(1)
-                                    if not file_url.startswith('http'):
-                                        file_url = f"https://documents.worldbank.org{file_url}"
-                        except Exception as e:
-                            print(f"Error extracting URL from document page: {str(e)}")
-                    
-                    if not file_url:
-                        # Try next format
-                        continue
-                    
-                    # Create filename with appropriate extension
-                    safe_title = "".join(c if c.isalnum() else "_" for c in title)
-                    filename = f"{doc_id}_{safe_title[:50]}.{file_format}"
-                    file_path = os.path.join(self.output_dir, filename)
-                    
-                    # Download the file
-                    response = requests.get(file_url, stream=True)
-                    
-                    # Skip to next format if file not found or other error
-                    if response.status_code != 200:
-                        print(f"Format {file_format} not available (status: {response.status_code})")
-                        continue
-                    
-                    # Check content type for validation
-                    content_type = response.headers.get('content-type', '').lower()
-                    content_type_valid = False
-                    
-                    # Validate content type based on format
-                    if file_format == 'pdf' and ('application/pdf' in content_type or 'pdf' in content_type):
-                        content_type_valid = True
-                    elif file_format == 'docx' and ('application/vnd.openxmlformats-officedocument.wordprocessingml.document' in content_type):
-                        content_type_valid = True
-                    elif file_format == 'doc' and ('application/msword' in content_type):
-                        content_type_valid = True
-                    elif file_format == 'tiff' and ('image/tiff' in content_type):
-                        content_type_valid = True
-                    
-                    if not content_type_valid:
-                        print(f"Warning: Document {doc_id} may not be a {file_format.upper()} (content-type: {content_type})")
-                    
-                    # Download the file
-                    total_size = int(response.headers.get('content-length', 0))
-                    with open(file_path, 'wb') as f:
-                        with tqdm(total=total_size, unit='B', unit_scale=True, 
-                                 desc=f"Downloading {filename}", leave=False) as pbar:
-                            for chunk in response.iter_content(chunk_size=8192):
-                                if chunk:
-                                    f.write(chunk)
-                                    pbar.update(len(chunk))
-                    
-                    # Format-specific file validation
-                    valid_file = False
-                    
-                    if file_format == 'pdf':
-                        # Validate PDF header
-                        with open(file_path, 'rb') as f:
-                            header = f.read(4)
-                            if header == b'%PDF':
-                                valid_file = True
-                    elif file_format == 'docx':
-                        # Basic check for DOCX (ZIP archive with specific structure)
-                        with open(file_path, 'rb') as f:
-                            header = f.read(4)
-                            if header == b'PK\x03\x04':
-                                valid_file = True
-                    elif file_format == 'doc':
-                        # Basic check for DOC magic number
-                        with open(file_path, 'rb') as f:
-                            header = f.read(8)
-                            if header[:2] == b'\xD0\xCF':
-                                valid_file = True
-                    elif file_format == 'tiff':
-                        # Check TIFF header
-                        with open(file_path, 'rb') as f:
-                            header = f.read(4)
-                            if header == b'II*\x00' or header == b'MM\x00*':
-                                valid_file = True
-                    
-                    if not valid_file:
-                        print(f"Downloaded file is not a valid {file_format.upper()}")
-                        os.remove(file_path)
+                        # Check content type for validation
+                        content_type = response.headers.get('content-type', '').lower()
+                        content_type_valid = False
+                        
+                        # Validate content type based on format
+                        if file_format == 'pdf' and ('application/pdf' in content_type or 'pdf' in content_type):
+                            content_type_valid = True
+                        elif file_format == 'docx' and ('application/vnd.openxmlformats-officedocument.wordprocessingml.document' in content_type):
+                            content_type_valid = True
+                        elif file_format == 'doc' and ('application/msword' in content_type):
+                            content_type_valid = True
+                        elif file_format == 'tiff' and ('image/tiff' in content_type):
+                            content_type_valid = True
+                        
+                        if not content_type_valid:
+                            print(f"Warning: Document {doc_id} may not be a {file_format.upper()} (content-type: {content_type})")
+                        
+                        # Download the file, rejecting it early if the signature is wrong
+                        transfer = self._download_verified(response, file_format, file_url, file_path,
+                                                           doc_id, desc=f"Downloading {filename}")
+                        
+                        if transfer is None:
+                            print(f"Downloaded file is not a valid {file_format.upper()}")
+                            self.emit_event(FORMAT_FALLBACK, doc_id=doc_id, format=file_format,
+                                            reason="invalid file signature")
+                            continue
+                        
+                        size, sha256, expected_size = transfer
+                        
+                        # If we got here, we have a valid file
+                        self.emit_event(DOCUMENT_FINISHED, doc_id=doc_id, success=True,
+                                        format=file_format, file=filename)
+                        return {
+                            "success": True, 
+                            "doc_id": doc_id, 
+                            "path": file_path,
+                            "format": file_format,
+                            "size": size,
+                            "expected_size": expected_size,
+                            "sha256": sha256
+                        }
+                        
+                    except Exception as e:
+                        print(f"Error trying {file_format} format for document {doc_id}: {str(e)}")
+                        self.emit_event(FORMAT_FALLBACK, doc_id=doc_id, format=file_format, reason=str(e))
                         continue
-                    
-                    # If we got here, we have a valid file
-                    return {
-                        "success": True, 
-                        "doc_id": doc_id, 
-                        "path": file_path,
-                        "format": file_format
-                    }
-                    
-                except Exception as e:
-                    print(f"Error trying {file_format} format for document {doc_id}: {str(e)}")
-                    continue
+            finally:
+                # Close any hedged requests that lost the race
+                responses.close()
             
             # If we get here, all formats failed
+            self.emit_event(DOCUMENT_FINISHED, doc_id=doc_id, success=False)
             return {"success": False, "doc_id": doc_id, "error": "Could not download document in any supported format"}
             
         except Exception as e:
+            self.emit_event(DOCUMENT_FINISHED, doc_id=doc.get("id", "unknown"), success=False)
             return {"success": False, "doc_id": doc.get("id", "unknown"), "error": str(e)}
     
+    def _candidate_urls(self, doc):
+        """List (format, url) pairs to try for a document, most preferred first.
+        
+        PDFs may have both the metadata pdfurl and a GUID-constructed mirror URL.
+        """
+        candidates = []
+        
+        for file_format in self.FORMAT_PREFERENCES:
+            urls = []
+            
+            # First try from document metadata
+            if file_format == "pdf" and doc.get("pdfurl"):
+                urls.append(doc["pdfurl"])
+            if doc.get("guid"):
+                urls.append(self._guid_url(doc["guid"], file_format))
+            
+            # If no direct URL, try to extract from the document page (for PDF only currently)
+            if not urls and file_format == "pdf" and "url" in doc:
+                page_url = self._url_from_document_page(doc["url"], file_format)
+                if page_url:
+                    urls.append(page_url)
+            
+            for url in urls:
+                if (file_format, url) not in candidates:
+                    candidates.append((file_format, url))
+        
+        return candidates
+    
+    def _guid_url(self, guid, file_format):
+        """Construct the download URL for a document GUID and format."""
+        return f"http://documents.worldbank.org/curated/en/{guid}/{file_format}/document.{file_format}"
+    
+    def _url_from_document_page(self, doc_page_url, file_format):
+        """Extract a download URL from a document's HTML page."""
+        import requests
+        print(f"No direct URL found. Trying to extract from document page: {doc_page_url}")
+        
+        try:
+            # Download the document page
+            response = requests.get(doc_page_url, timeout=(self.connect_timeout, self.first_byte_timeout))
+            response.raise_for_status()
+            html_content = response.text
+            
+            # Extract the document ID/GUID from the canonical URL
+            import re
+            canonical_match = re.search(r'<link rel="canonical" href="[^"]+/en/(\d+)"', html_content)
+            if canonical_match:
+                return self._guid_url(canonical_match.group(1), file_format)
+            
+            # Try to find URL directly in the HTML
+            format_match = re.search(rf'href="([^"]+\.{file_format})"', html_content)
+            if format_match:
+                file_url = format_match.group(1)
+                if not file_url.startswith('http'):
+                    file_url = f"https://documents.worldbank.org{file_url}"
+                return file_url
+        except Exception as e:
+            print(f"Error extracting URL from document page: {str(e)}")
+        
+        return None
+    
+    def _open_candidates(self, candidates, doc_id):
+        """Yield (format, url, response) for each candidate that answers with 200.
+        
+        Without hedging, candidates are requested one at a time in order. With
+        hedge_delay set, responses are yielded in the order they arrive, and
+        requests still in flight when the caller stops are closed on completion.
+        """
+        if self.hedge_delay is None:
+            for file_format, url in candidates:
+                response = self._request_candidate(file_format, url, doc_id)
+                if response is not None:
+                    yield file_format, url, response
+            return
+        
+        # Enough threads for every download worker to race all of its candidates
+        concurrency = self.scheduler.max_workers if self.scheduler is not None else self.max_workers
+        pool = _get_hedge_pool(concurrency * (len(self.FORMAT_PREFERENCES) + 1))
+        remaining = list(enumerate(candidates))
+        pending = {}  # future -> (index, format, url)
+        started_at = {}  # index -> time its request started running
+        
+        def launch():
+            index, (file_format, url) = remaining.pop(0)
+            started = threading.Event()
+            
+            def request():
+                started_at[index] = time.monotonic()
+                started.set()
+                return self._request_candidate(file_format, url, doc_id)
+            
+            future = pool.submit(request)
+            pending[future] = (index, file_format, url)
+            return index, started
+        
+        try:
+            latest = None
+            while pending or remaining:
+                if not pending:
+                    latest = launch()
+                
+                timeout = None
+                if remaining:
+                    # Start the hedge timer only once the latest request is
+                    # running, so a busy pool doesn't trigger more requests
+                    index, started = latest
+                    started.wait()
+                    timeout = max(0.0, started_at[index] + self.hedge_delay - time.monotonic())
+                
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # Nothing has answered in time, race the next candidate
+                    print(f"No response for document {doc_id} after {self.hedge_delay}s, hedging")
+                    self.emit_event(FORMAT_FALLBACK, doc_id=doc_id, format=remaining[0][1][0],
+                                    reason="hedged")
+                    latest = launch()
+                    continue
+                
+                # Prefer the more preferred candidate if several finished together
+                for future in sorted(done, key=lambda f: pending[f][0]):
+                    _, file_format, url = pending.pop(future)
+                    response = future.result()
+                    if response is not None:
+                        yield file_format, url, response
+        finally:
+            for future in pending:
+                future.add_done_callback(_close_response)
+    
+    def _request_candidate(self, file_format, url, doc_id):
+        """Request one candidate URL and return the response, or None if unusable."""
+        import requests
+        try:
+            response = requests.get(url, stream=True,
+                                    timeout=(self.connect_timeout, self.first_byte_timeout))
+        except Exception as e:
+            print(f"Error trying {file_format} format for document {doc_id}: {str(e)}")
+            self.emit_event(FORMAT_FALLBACK, doc_id=doc_id, format=file_format, reason=str(e))
+            return None
+        
+        # Skip to next format if file not found or other error
+        if response.status_code != 200:
+            print(f"Format {file_format} not available (status: {response.status_code})")
+            response.close()
+            self.emit_event(FORMAT_FALLBACK, doc_id=doc_id, format=file_format,
+                            reason=f"status {response.status_code}")
+            return None
+        
+        _set_read_timeout(response, self.stall_timeout)
+        return response
+    
+    def _download_verified(self, response, file_format, file_url, file_path, doc_id, desc):
+        """Stream a candidate to disk, re-requesting it if the body is truncated.
+        
+        The byte count is compared with the content-length header. Short bodies,
+        dropped or reset connections and bodies that stall partway are retried
+        on the same URL up to integrity_retries times.
+        
+        Returns:
+            Tuple of (bytes written, SHA-256 hex digest, expected size or None),
+            or None if the body does not have a valid signature
+        """
+        import requests
+        from urllib3.exceptions import ProtocolError, ReadTimeoutError
+        
+        # Errors that mean the body was cut off, on the readinto and iter_content paths
+        truncated_errors = (
+            ProtocolError,
+            ReadTimeoutError,
+            requests.exceptions.ChunkedEncodingError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        )
+        
+        attempt = 0
+        while True:
+            expected_size = self._expected_size(response)
+            try:
+                transfer = self._stream_to_file(response, file_path, file_format, doc_id, desc)
+                if transfer is None:
+                    return None
+                size, sha256 = transfer
+                if expected_size is None or size == expected_size:
+                    return size, sha256, expected_size
+                os.remove(file_path)
+                problem = f"got {size} bytes, expected {expected_size}"
+            except truncated_errors as e:
+                problem = str(e)
+            
+            attempt += 1
+            if attempt > self.integrity_retries:
+                raise IOError(f"Incomplete download after {attempt} attempts: {problem}")
+            
+            print(f"Incomplete download of document {doc_id} ({problem}), retrying")
+            response = self._request_candidate(file_format, file_url, doc_id)
+            if response is None:
+                raise IOError(f"Incomplete download and retry failed: {problem}")
+    
+    def _expected_size(self, response):
+        """Return the body size promised by the headers, if it can be checked."""
+        encoding = response.headers.get('content-encoding', '').lower()
+        length = response.headers.get('content-length')
+        # A compressed body's content-length doesn't match the decoded size
+        if encoding not in ('', 'identity') or not length or not length.isdigit():
+            return None
+        return int(length)
+    
+    def _stream_to_file(self, response, file_path, file_format, doc_id, desc):
+        """Stream a response body to disk, checking its signature first.
+        
+        Only the signature bytes are read first and validated in memory, so a
+        wrong format is rejected after a few bytes, before the file is created.
+        The rest of the body is read in chunks whose size adapts to throughput
+        (fewer Python-level iterations than fixed 8 KB chunks) and is hashed as
+        it is written, so the file never has to be read back.
+        
+        Returns:
+            Tuple of (bytes written, SHA-256 hex digest), or None if the body does
+            not start with a valid signature for file_format
+        """
+        try:
+            total_size = int(response.headers.get('content-length', 0))
+            read_into = self._body_reader(response)
+            view = memoryview(bytearray(self.MAX_CHUNK_SIZE))
+            
+            # Read only the signature bytes; a buffered read of a larger amount
+            # would block until that much arrived
+            n = 0
+            while n < SIGNATURE_LENGTH:
+                read = read_into(view[n:SIGNATURE_LENGTH])
+                if not read:
+                    break
+                n += read
+            # A body shorter than a signature can't be a real document
+            if n < SIGNATURE_LENGTH or not has_valid_signature(file_format, bytes(view[:n])):
+                return None
+            
+            sha256 = hashlib.sha256()
+            transferred = 0
+            last_report = 0.0
+            chunk_size = self.MIN_CHUNK_SIZE
+            try:
+                with open(file_path, 'wb') as f:
+                    with self._progress_bar(total=total_size, unit='B', unit_scale=True,
+                                            desc=desc, leave=False) as pbar:
+                        while n:
+                            chunk = view[:n]
+                            f.write(chunk)
+                            sha256.update(chunk)
+                            transferred += n
+                            pbar.update(n)
+                            
+                            # Throttle byte events so subscribers aren't flooded
+                            if self.progress is not None and self.progress.active:
+                                now = time.monotonic()
+                                if now - last_report >= self.BYTES_EVENT_INTERVAL:
+                                    last_report = now
+                                    self.progress.emit(BYTES_TRANSFERRED, doc_id=doc_id,
+                                                       bytes=transferred, total=total_size)
+                            
+                            started = time.monotonic()
+                            n = read_into(view[:chunk_size])
+                            chunk_size = self._next_chunk_size(chunk_size, n, time.monotonic() - started)
+            except BaseException:
+                # Don't leave a truncated file behind
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                raise
+            
+            self.emit_event(BYTES_TRANSFERRED, doc_id=doc_id, bytes=transferred, total=total_size)
+            return transferred, sha256.hexdigest()
+        finally:
+            response.close()
+    
+    def _body_reader(self, response):
+        """Return a readinto-style function for the response body.
+        
+        Uncompressed bodies use urllib3's readinto, which reads each chunk and
+        copies it into the caller's buffer (it is not zero-copy). Compressed
+        bodies go through requests' decoder instead.
+        """
+        encoding = response.headers.get('content-encoding', '').lower()
+        if encoding in ('', 'identity') and hasattr(response.raw, 'readinto'):
+            return response.raw.readinto
+        
+        chunks = response.iter_content(chunk_size=self.MIN_CHUNK_SIZE)
+        leftover = b''
+        
+        def read_into(target):
+            nonlocal leftover
+            while not leftover:
+                leftover = next(chunks, None)
+                if leftover is None:
+                    leftover = b''
+                    return 0
+            n = min(len(target), len(leftover))
+            target[:n] = leftover[:n]
+            leftover = leftover[n:]
+            return n
+        
+        return read_into
+    
+    def _next_chunk_size(self, chunk_size, read, elapsed):
+        """Grow the chunk size on fast full reads and shrink it on slow ones."""
+        if read == chunk_size and elapsed < self.TARGET_READ_SECONDS / 2:
+            return min(chunk_size * 2, self.MAX_CHUNK_SIZE)
+        if elapsed > self.TARGET_READ_SECONDS * 2:
+            return max(chunk_size // 2, self.MIN_CHUNK_SIZE)
+        return chunk_size
+    
     def bulk_download(self, documents):
-        """Download multiple documents in parallel."""
+        """Download multiple documents in parallel.
+        
+        Args:
+            documents: List of document metadata dictionaries
+            
+        Returns:
+            Dictionary with "success" and "failed" result lists
+        """
         results = {"success": [], "failed": []}
         
-        with tqdm(total=len(documents), desc="Downloading documents") as pbar:
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                future_to_doc = {executor.submit(self.download_document, doc): doc for doc in documents}
-                
-                for future in future_to_doc:
-                    result = future.result()
-                    if result["success"]:
-                        results["success"].append(result)
-                    else:
-                        results["failed"].append(result)
-                    pbar.update(1)
-                    
-                    # Honor rate limits between downloads
-                    time.sleep(self.rate_limit)
+        with self._progress_bar(total=len(documents), desc="Downloading documents") as pbar:
+            if self.scheduler is not None:
+                futures = self.scheduler.submit_job(
+                    self.download_document,
+                    [(doc,) for doc in documents]
+                )
+                self._collect_results(futures, results, pbar)
+            else:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = [executor.submit(self.download_document, doc) for doc in documents]
+                    self._collect_results(futures, results, pbar)
         
         return results
     
+    def _collect_results(self, futures, results, pbar):
+        """Wait for download futures in order and sort them into results."""
+        for future in futures:
+            result = future.result()
+            if result["success"]:
+                results["success"].append(result)
+            else:
+                results["failed"].append(result)
+            pbar.update(1)
+            
+            # Honor rate limits between downloads
+            time.sleep(self.rate_limit)
+    
     def search_by_project_ids(self, project_ids, doc_type=None, max_results=100, rate_limit=1):
         """Search for documents related to specific project IDs."""
         all_documents = {}
         
-        for project_id in tqdm(project_ids, desc="Processing project IDs"):
+        for project_id in self._progress_bar(project_ids, desc="Processing project IDs"):
             # Initialize parameters
             params = {
                 "format": "json",
@@ -300,16 +728,18 @@ class WorldBankDocDownloader:
     
     def _fetch_documents(self, params, max_results=100, rate_limit=1):
         """Helper method to fetch documents using pagination."""
+        import requests
         all_documents = []
         page = 0  # API uses 0-based pagination with 'os' parameter
         
-        with tqdm(desc=f"Fetching documents", unit="page", leave=False) as pbar:
+        with self._progress_bar(desc=f"Fetching documents", unit="page", leave=False) as pbar:
             while len(all_documents) < max_results:
                 # Update pagination parameter
                 params["os"] = page * params.get("rows", 50)
                 
                 try:
-                    response = requests.get(self.BASE_URL, params=params)
+                    response = requests.get(self.BASE_URL, params=params,
+                                            timeout=(self.connect_timeout, self.first_byte_timeout))
                     response.raise_for_status()
                     data = response.json()
                     
@@ -337,6 +767,9 @@ class WorldBankDocDownloader:
                     # Debug: Print the first document structure
                     if documents and len(documents) > 0:
                         print(f"First document keys: {list(documents[0].keys())}")
+                    
+                    self.emit_event(PAGE_FETCHED, page=page, count=len(documents),
+                                    project_id=params.get("projectid"))
                         
                     # Add documents to our collection
                     remaining = max_results - len(all_documents)
@@ -379,12 +812,16 @@ class WorldBankDocDownloader:
         for project_id, documents in project_documents.items():
             print(f"Downloading {len(documents)} documents for project {project_id}")
             project_results = self.bulk_download(documents)
+            for result in project_results["success"]:
+                result["project_id"] = project_id
             results[project_id] = project_results
             
         return results
 
 def main():
     """Command line interface for the document downloader."""
+    import argparse
+    
     parser = argparse.ArgumentParser(description="Download documents from the World Bank API")
     
     # Create subparsers for different modes
@@ -410,18 +847,64 @@ def main():
     project_parser.add_argument("--doc-type", type=str, help="Document type filter")
     project_parser.add_argument("--max-per-project", type=int, default=100, help="Maximum documents per project")
     
+    # Coordinator mode: queue documents for workers instead of downloading them
+    for mode_parser in (search_parser, project_parser):
+        mode_parser.add_argument("--queue", type=str,
+                                 help="Queue (local SQLite file or queue-server URL) to put documents on for 'worker' processes instead of downloading")
+    
+    # Worker mode: download documents queued by a coordinator
+    worker_parser = subparsers.add_parser('worker', help='Download documents from a shared queue')
+    worker_parser.add_argument("--queue", type=str, required=True,
+                               help="Queue to work on: a SQLite file on this machine's local disk, or a queue-server URL")
+    worker_parser.add_argument("--worker-id", type=str, help="Worker ID recorded on leases (default: host name and PID)")
+    worker_parser.add_argument("--poll-interval", type=float, default=5, help="Seconds to wait when no task is available")
+    worker_parser.add_argument("--wait", action="store_true", help="Keep polling for new tasks instead of exiting when the queue is empty")
+    
+    # Server mode: share a local queue file with workers on other machines
+    server_parser = subparsers.add_parser('queue-server', help='Serve a local queue file to workers on other machines')
+    server_parser.add_argument("--queue", type=str, required=True, help="SQLite queue file on this machine's local disk")
+    server_parser.add_argument("--host", type=str, default="127.0.0.1",
+                               help="Address to listen on (use 0.0.0.0 on a trusted network; there is no authentication)")
+    server_parser.add_argument("--port", type=int, default=8750, help="Port to listen on")
+    
+    # Queue settings, used by whichever process opens the queue file
+    for queue_parser in (worker_parser, server_parser):
+        queue_parser.add_argument("--lease-seconds", type=float, default=600,
+                                  help="Seconds before a task whose worker stops renewing its lease is given to another worker")
+        queue_parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per document before it is marked failed")
+        queue_parser.add_argument("--retry-backoff", type=float, default=30,
+                                  help="Seconds before a failed document is retried (doubles each attempt)")
+    
+    status_parser = subparsers.add_parser('queue-status', help='Show the progress of a shared queue')
+    status_parser.add_argument("--queue", type=str, required=True, help="SQLite queue file or queue-server URL")
+    status_parser.add_argument("--manifest", action="store_true", help="Write a checksum manifest of finished downloads to --output-dir")
+    
     # Common parameters for both modes
     parser.add_argument("--output-dir", type=str, default="downloads", help="Directory to save downloads")
     parser.add_argument("--workers", type=int, default=5, help="Number of parallel downloads")
     parser.add_argument("--rate-limit", type=float, default=1.0, help="Sleep time between requests")
+    parser.add_argument("--connect-timeout", type=float, default=10, help="Seconds to wait for a connection")
+    parser.add_argument("--first-byte-timeout", type=float, default=30, help="Seconds to wait for response headers")
+    parser.add_argument("--stall-timeout", type=float, default=60, help="Seconds a download may stall before it is abandoned")
+    parser.add_argument("--hedge-delay", type=float, help="Start the next candidate URL if no response after this many seconds")
+    parser.add_argument("--integrity-retries", type=int, default=2, help="Times to retry a truncated download")
     
     args = parser.parse_args()
     
+    # Only the queue modes need SQLite
+    if getattr(args, 'queue', None):
+        from work_queue import SQLiteTaskQueue, open_queue, serve_queue, default_worker_id, run_worker
+    
     # Initialize downloader
     downloader = WorldBankDocDownloader(
         output_dir=args.output_dir,
         max_workers=args.workers,
-        rate_limit=args.rate_limit
+        rate_limit=args.rate_limit,
+        connect_timeout=args.connect_timeout,
+        first_byte_timeout=args.first_byte_timeout,
+        stall_timeout=args.stall_timeout,
+        hedge_delay=args.hedge_delay,
+        integrity_retries=args.integrity_retries
     )
     
     if args.command == 'search':
@@ -442,10 +925,17 @@ def main():
             print("No documents found matching your criteria.")
             return
         
+        if args.queue:
+            added = open_queue(args.queue).put_many(documents)
+            print(f"Queued {added} new documents in {args.queue}")
+            return
+        
         # Download documents
         print(f"Downloading {len(documents)} documents...")
         results = downloader.bulk_download(documents)
         
+        write_manifest(manifest_entries(results['success']), args.output_dir)
+        
         # Report results
         print(f"\nDownload complete!")
         print(f"Successfully downloaded: {len(results['success'])} documents")
@@ -492,10 +982,20 @@ def main():
         if total_docs == 0:
             print("No documents found matching your criteria.")
             return
+        
+        if args.queue:
+            task_queue = open_queue(args.queue)
+            added = sum(task_queue.put_many(docs, project_id=project_id)
+                        for project_id, docs in project_documents.items())
+            print(f"Queued {added} new documents in {args.queue}")
+            return
             
         # Download documents by project
         results = downloader.bulk_download_by_projects(project_documents)
         
+        all_success = [result for res in results.values() for result in res.get('success', [])]
+        write_manifest(manifest_entries(all_success), args.output_dir)
+        
         # Aggregate and report results
         total_success = sum(len(res.get('success', [])) for res in results.values())
         total_failed = sum(len(res.get('failed', [])) for res in results.values())
@@ -515,6 +1015,47 @@ def main():
                     if len(failed) > 5:
                         print(f"  - ... and {len(failed) - 5} more")
     
+    elif args.command == 'worker':
+        task_queue = open_queue(args.queue, lease_seconds=args.lease_seconds,
+                                max_attempts=args.max_attempts, retry_backoff=args.retry_backoff)
+        worker_id = args.worker_id or default_worker_id()
+        print(f"Worker {worker_id} processing queue {args.queue} with {args.workers} threads...")
+        stats = run_worker(
+            task_queue,
+            downloader,
+            worker_id=worker_id,
+            threads=args.workers,
+            poll_interval=args.poll_interval,
+            wait=args.wait
+        )
+        
+        print(f"\nWorker finished!")
+        print(f"Successfully downloaded: {stats['completed']} documents")
+        print(f"Failed attempts: {stats['failed']}")
+    
+    elif args.command == 'queue-server':
+        task_queue = SQLiteTaskQueue(args.queue, lease_seconds=args.lease_seconds,
+                                     max_attempts=args.max_attempts, retry_backoff=args.retry_backoff)
+        serve_queue(task_queue, host=args.host, port=args.port)
+    
+    elif args.command == 'queue-status':
+        task_queue = open_queue(args.queue)
+        counts = task_queue.counts()
+        for status in ("pending", "leased", "done", "failed"):
+            print(f"{status.capitalize()}: {counts[status]}")
+        
+        failed = task_queue.results("failed")
+        if failed:
+            print("\nFailed downloads:")
+            for fail in failed[:20]:
+                print(f"  - Document ID {fail.get('doc_id')}: {fail.get('error')}")
+            if len(failed) > 20:
+                print(f"  - ... and {len(failed) - 20} more")
+        
+        if args.manifest:
+            write_manifest(manifest_entries(task_queue.results("done")), args.output_dir)
+            print(f"\nManifest written to {args.output_dir}")
+    
     else:
         parser.print_help()
 
@@ -33,9 +33,47 @@ function AppContent() {
   const [documents, setDocuments] = useState<Document[]>([])
   const [loading, setLoading] = useState<boolean>(false)
   const [error, setError] = useState<string | null>(null)
+  const [progress, setProgress] = useState<string | null>(null)
 
   const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000'
 
+  // crypto.randomUUID is only available in secure contexts (https or localhost)
+  const newJobId = () =>
+    typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function'
+      ? crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`
+
+  // Subscribe to server-sent progress events for a download job. Progress is
+  // optional, so this returns null instead of throwing if the stream can't open.
+  const openProgressStream = async (jobId: string, total: number) => {
+    let events: EventSource
+    try {
+      events = new EventSource(`${API_BASE_URL}/api/jobs/${jobId}/events`)
+    } catch {
+      return null
+    }
+    let finished = 0
+
+    events.addEventListener('document-finished', () => {
+      finished += 1
+      setProgress(`Downloaded ${finished} of ${total} documents...`)
+    })
+    events.addEventListener('zip-member-written', (event) => {
+      const data = JSON.parse((event as MessageEvent).data)
+      setProgress(`Adding ${data.name} to archive...`)
+    })
+    events.addEventListener('job-finished', () => events.close())
+
+    // Wait until the stream is open so no early events are missed, but don't
+    // hold up the download for long if it never connects
+    await new Promise(resolve => {
+      events.onopen = resolve
+      events.onerror = resolve
+      setTimeout(resolve, 2000)
+    })
+    return events
+  }
+
   const handleProjectSearch = async (params: ProjectSearchParams) => {
     setLoading(true)
     setError(null)
@@ -75,13 +113,19 @@ function AppContent() {
   }
 
   const handleDownload = async (selectedDocs: Document[]) => {
+    let events: EventSource | null = null
+
     try {
+      const jobId = newJobId()
+      events = await openProgressStream(jobId, selectedDocs.length)
+      setProgress(`Starting download of ${selectedDocs.length} documents...`)
+
       const response = await fetch(`${API_BASE_URL}/api/download`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ documents: selectedDocs }),
+        body: JSON.stringify({ documents: selectedDocs, jobId }),
       })
       
       if (!response.ok) {
@@ -99,17 +143,26 @@ function AppContent() {
       window.URL.revokeObjectURL(url)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An unknown error occurred')
+    } finally {
+      events?.close()
+      setProgress(null)
     }
   }
 
   const handleDownloadAndRename = async (selectedDocs: Document[]) => {
+    let events: EventSource | null = null
+
     try {
+      const jobId = newJobId()
+      events = await openProgressStream(jobId, selectedDocs.length)
+      setProgress(`Starting download of ${selectedDocs.length} documents...`)
+
       const response = await fetch(`${API_BASE_URL}/api/download-and-rename`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ documents: selectedDocs }),
+        body: JSON.stringify({ documents: selectedDocs, jobId }),
       })
       
       if (!response.ok) {
@@ -127,6 +180,9 @@ function AppContent() {
       window.URL.revokeObjectURL(url)
     } catch (err) {
       setError(err instanceof Error ? err.message : 'An unknown error occurred')
+    } finally {
+      events?.close()
+      setProgress(null)
     }
   }
 
@@ -145,6 +201,8 @@ function AppContent() {
         
         {error && <div className="error-message">{error}</div>}
         
+        {progress && <div className="download-progress">{progress}</div>}
+        
         {!loading && documents.length > 0 && (
           <DocumentList 
             documents={documents} 